@@ -5,260 +5,227 @@ Creates an interactive HTML map with all 6 animal classes and corrected time-bas
 """
 
 import requests
+import gzip
 import json
+import math
 import os
+import re
+import numpy as np
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple, Union
+from collections import Counter
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from json.encoder import encode_basestring_ascii
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+try:
+    from ciso8601 import parse_datetime  # Optional: C ISO 8601 parser
+except ImportError:
+    parse_datetime = None
 
-class SimpleAnimalMap:
-    def __init__(self):
-        self.base_url = "https://www.movebank.org/movebank/service/public/json"
-        self.animal_colors = {
-            'bird': '#FF6B6B',
-            'mammal': '#4ECDC4', 
-            'reptile': '#45B7D1',
-            'fish': '#96CEB4',
-            'amphibian': '#FFEAA7',
-            'insect': '#DDA0DD',
-            'unknown': '#74B9FF'
-        }
-    
-    def get_movebank_studies(self) -> List[Dict]:
-        """Get list of public studies with animal type information"""
-        try:
-            params = {'entity_type': 'study'}
-            response = requests.get(self.base_url, params=params, timeout=15)
-            if response.status_code == 200:
-                studies = response.json()
-                return [s for s in studies if s.get('is_test', False) == False and 
-                       s.get('has_quota', False) == False][:20]  # Public studies only
-        except Exception as e:
-            print(f"Error fetching studies: {e}")
-        return []
-    
-    def classify_animal_from_study(self, study_info: Dict) -> str:
-        """Classify animal type based on study information"""
-        study_name = study_info.get('name', '').lower()
-        principal_investigator = study_info.get('principal_investigator_name', '').lower()
-        
-        # Bird keywords
-        bird_keywords = ['bird', 'avian', 'eagle', 'hawk', 'falcon', 'owl', 'swan', 'crane', 
-                        'stork', 'tern', 'albatross', 'petrel', 'gull', 'duck', 'goose']
-        
-        # Mammal keywords  
-        mammal_keywords = ['mammal', 'whale', 'dolphin', 'seal', 'bear', 'wolf', 'deer', 
-                          'elk', 'caribou', 'moose', 'cat', 'dog', 'bat', 'elephant']
-        
-        # Marine keywords
-        marine_keywords = ['fish', 'shark', 'tuna', 'salmon', 'turtle', 'marine']
-        
-        # Reptile keywords
-        reptile_keywords = ['turtle', 'snake', 'lizard', 'reptile', 'crocodile', 'iguana']
-        
-        # Check study name for keywords
-        text_to_check = f"{study_name} {principal_investigator}"
-        
-        if any(keyword in text_to_check for keyword in bird_keywords):
-            return 'bird'
-        elif any(keyword in text_to_check for keyword in mammal_keywords):
-            return 'mammal'
-        elif any(keyword in text_to_check for keyword in marine_keywords):
-            if any(keyword in text_to_check for keyword in reptile_keywords):
-                return 'reptile'
-            else:
-                return 'fish'
-        elif any(keyword in text_to_check for keyword in reptile_keywords):
+try:
+    import requests_cache  # Optional: on-disk cache of Movebank responses
+except ImportError:
+    requests_cache = None
+
+
+# Bird keywords
+BIRD_KEYWORDS = ['bird', 'avian', 'eagle', 'hawk', 'falcon', 'owl', 'swan', 'crane',
+                 'stork', 'tern', 'albatross', 'petrel', 'gull', 'duck', 'goose']
+
+# Mammal keywords
+MAMMAL_KEYWORDS = ['mammal', 'whale', 'dolphin', 'seal', 'bear', 'wolf', 'deer',
+                   'elk', 'caribou', 'moose', 'cat', 'dog', 'bat', 'elephant']
+
+# Marine keywords
+MARINE_KEYWORDS = ['fish', 'shark', 'tuna', 'salmon', 'turtle', 'marine']
+
+# Reptile keywords
+REPTILE_KEYWORDS = ['turtle', 'snake', 'lizard', 'reptile', 'crocodile', 'iguana']
+
+
+def _keyword_pattern(keywords: List[str]) -> re.Pattern:
+    """Compile keywords into a single substring-matching alternation"""
+    return re.compile('|'.join(map(re.escape, keywords)))
+
+
+# One precompiled scan per category instead of a Python-level loop per keyword.
+# Matching is on substrings, not whole tokens, so plurals and compounds such as
+# "terns" or "seabirds" still classify; a token-set lookup would miss them.
+_BIRD_RE = _keyword_pattern(BIRD_KEYWORDS)
+_MAMMAL_RE = _keyword_pattern(MAMMAL_KEYWORDS)
+_MARINE_RE = _keyword_pattern(MARINE_KEYWORDS)
+_REPTILE_RE = _keyword_pattern(REPTILE_KEYWORDS)
+
+
+@lru_cache(maxsize=1024)
+def _classify(study_name: str, principal_investigator: str) -> str:
+    """Classify animal type from lowercased study name and investigator"""
+    # Check study name for keywords
+    text_to_check = f"{study_name} {principal_investigator}"
+
+    if _BIRD_RE.search(text_to_check):
+        return 'bird'
+    elif _MAMMAL_RE.search(text_to_check):
+        return 'mammal'
+    elif _MARINE_RE.search(text_to_check):
+        if _REPTILE_RE.search(text_to_check):
             return 'reptile'
-        
-        return 'unknown'
+        else:
+            return 'fish'
+    elif _REPTILE_RE.search(text_to_check):
+        return 'reptile'
 
-    def get_sample_data(self) -> List[Dict]:
-        """Get sample tracking data from multiple studies"""
-        print("Fetching public studies...")
-        
-        # Get list of studies first
-        studies = self.get_movebank_studies()
-        if not studies:
-            print("No studies found, using known study IDs...")
-            studies = [{'id': 2911040}, {'id': 173641633}, {'id': 76367850}]
-        
-        all_data = []
-        successful_studies = 0
-        
-        for study in studies[:10]:  # Limit to first 10 studies
-            study_id = study.get('id')
-            if not study_id:
-                continue
-                
-            try:
-                # Get study info if not already available
-                if 'name' not in study:
-                    study_params = {'entity_type': 'study', 'study_id': study_id}
-                    study_response = requests.get(self.base_url, params=study_params, timeout=10)
-                    if study_response.status_code == 200:
-                        study_data = study_response.json()
-                        if study_data:
-                            study.update(study_data[0] if isinstance(study_data, list) else study_data)
-                
-                # Classify animal type
-                animal_type = self.classify_animal_from_study(study)
-                
-                # Get tracking data
-                params = {
-                    'entity_type': 'event',
-                    'study_id': study_id,
-                    'max_events_per_individual': 20,
-                    'limit': 100
-                }
-                
-                response = requests.get(self.base_url, params=params, timeout=15)
-                if response.status_code == 200:
-                    data = response.json()
-                    
-                    if data and len(data) > 0:
-                        valid_records = 0
-                        for record in data:
-                            lat = record.get('location_lat')
-                            lon = record.get('location_long')
-                            
-                            if lat and lon:
-                                try:
-                                    lat, lon = float(lat), float(lon)
-                                    if -90 <= lat <= 90 and -180 <= lon <= 180:
-                                        record['animal_type'] = animal_type
-                                        record['study_name'] = study.get('name', f'Study {study_id}')
-                                        record['species'] = self.extract_species_from_study(study)
-                                        all_data.append(record)
-                                        valid_records += 1
-                                except ValueError:
-                                    continue
-                        
-                        if valid_records > 0:
-                            successful_studies += 1
-                            print(f"✓ Got {valid_records} points from study {study_id} ({animal_type})")
-                
-            except Exception as e:
-                print(f"✗ Error with study {study_id}: {e}")
-                continue
-            
-            if successful_studies >= 5:  # Stop after 5 successful studies
-                break
-        
-        print(f"Successfully processed {successful_studies} studies")
-        return all_data[:300]  # Limit for performance
-    
-    def extract_species_from_study(self, study_info: Dict) -> str:
-        """Extract species name from study information"""
-        study_name = study_info.get('name', '')
-        
-        # Common species patterns
-        species_patterns = {
-            'arctic tern': 'Arctic Tern',
-            'gray whale': 'Gray Whale', 
-            'humpback whale': 'Humpback Whale',
-            'loggerhead': 'Loggerhead Turtle',
-            'bald eagle': 'Bald Eagle',
-            'golden eagle': 'Golden Eagle',
-            'brown bear': 'Brown Bear',
-            'polar bear': 'Polar Bear',
-            'caribou': 'Caribou',
-            'elk': 'Elk',
-            'white shark': 'Great White Shark',
-            'bluefin tuna': 'Bluefin Tuna'
-        }
-        
-        study_lower = study_name.lower()
-        for pattern, species in species_patterns.items():
-            if pattern in study_lower:
-                return species
-        
-        # Extract first word that might be species
-        words = study_name.split()
-        if len(words) >= 2:
-            return f"{words[0]} {words[1]}"
-        
-        return 'Unknown Species'
-    
-    def calculate_time_intensity(self, timestamp) -> float:
-        """Calculate time-based intensity (recent = higher value for lighter colors)"""
-        if not timestamp:
-            return 0.5
-        
-        try:
-            if isinstance(timestamp, str) and 'T' in timestamp:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-            else:
-                dt = datetime.fromtimestamp(float(timestamp) / 1000, tz=timezone.utc)
-            
-            # Use fixed reference date for consistency
-            now = datetime(2024, 7, 31, tzinfo=timezone.utc)
-            age_days = (now - dt).total_seconds() / 86400
-            
-            # CORRECTED: Recent = higher intensity (lighter), Older = lower intensity (darker)
-            intensity = max(0.3, min(1.0, 1 - (age_days / 180)))
-            return intensity
-        except:
-            return 0.5
-    
-    def adjust_color_intensity(self, base_color: str, intensity: float) -> str:
-        """Adjust color based on recency (higher intensity = lighter/more recent)"""
+    return 'unknown'
+
+
+# Common species patterns
+SPECIES_PATTERNS = {
+    'arctic tern': 'Arctic Tern',
+    'gray whale': 'Gray Whale',
+    'humpback whale': 'Humpback Whale',
+    'loggerhead': 'Loggerhead Turtle',
+    'bald eagle': 'Bald Eagle',
+    'golden eagle': 'Golden Eagle',
+    'brown bear': 'Brown Bear',
+    'polar bear': 'Polar Bear',
+    'caribou': 'Caribou',
+    'elk': 'Elk',
+    'white shark': 'Great White Shark',
+    'bluefin tuna': 'Bluefin Tuna'
+}
+
+_SPECIES_RE = re.compile('|'.join(map(re.escape, SPECIES_PATTERNS)), re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def _extract_species(study_name: str) -> str:
+    """Extract species name from a study name"""
+    match = _SPECIES_RE.search(study_name)
+    if match:
+        return SPECIES_PATTERNS[match.group(0).lower()]
+
+    # Extract first word that might be species
+    words = study_name.split()
+    if len(words) >= 2:
+        return f"{words[0]} {words[1]}"
+
+    return 'Unknown Species'
+
+
+# Use fixed reference date for consistency
+REFERENCE_DATE = datetime(2024, 7, 31, tzinfo=timezone.utc)
+
+
+def _parse_timestamp(timestamp: str) -> datetime:
+    """Parse an ISO 8601 timestamp, with a fast path for 'YYYY-MM-DDTHH:MM:SSZ'"""
+    ts = timestamp
+    if (len(ts) == 20 and ts[19] == 'Z' and ts[10] == 'T' and ts[4] == '-' and ts[7] == '-'
+            and ts[13] == ':' and ts[16] == ':'):
+        return datetime(int(ts[0:4]), int(ts[5:7]), int(ts[8:10]),
+                        int(ts[11:13]), int(ts[14:16]), int(ts[17:19]), tzinfo=timezone.utc)
+    if parse_datetime is not None:
+        return parse_datetime(ts)
+    return datetime.fromisoformat(ts.replace('Z', '+00:00'))
+
+
+@lru_cache(maxsize=8192)
+def _time_intensity(timestamp: str) -> float:
+    """Map a raw timestamp string to a recency intensity in [0.3, 1.0]"""
+    try:
+        if 'T' in timestamp:
+            dt = _parse_timestamp(timestamp)
+        else:
+            dt = datetime.fromtimestamp(float(timestamp) / 1000, tz=timezone.utc)
+
+        age_days = (REFERENCE_DATE - dt).total_seconds() / 86400
+
+        # CORRECTED: Recent = higher intensity (lighter), Older = lower intensity (darker)
+        intensity = max(0.3, min(1.0, 1 - (age_days / 180)))
+        return intensity
+    except:
+        return 0.5
+
+
+def _timestamp_sort_key(timestamp) -> Tuple[int, object]:
+    """Sort key putting epoch-millisecond timestamps in numeric order, others as text"""
+    if isinstance(timestamp, (int, float)):
+        return 0, float(timestamp)
+    timestamp = str(timestamp)
+    if 'T' not in timestamp:
         try:
-            # Convert hex to RGB
-            r = int(base_color[1:3], 16)
-            g = int(base_color[3:5], 16) 
-            b = int(base_color[5:7], 16)
-            
-            # CORRECTED: Higher intensity = brighter (more recent), Lower intensity = darker (older)
-            white_blend = 1 - intensity  # Amount to blend with white for recent points
-            r = round(r + (255 - r) * white_blend)
-            g = round(g + (255 - g) * white_blend)
-            b = round(b + (255 - b) * white_blend)
-            
-            # Convert back to hex
-            return f"#{r:02x}{g:02x}{b:02x}"
-        except:
-            return base_color
-    
-    def generate_html_map(self, data: List[Dict], filename: str = "animal_map.html"):
-        """Generate enhanced interactive HTML map with v3 improvements"""
-        
-        # Process data and count individuals properly
-        markers = []
-        animal_counts = {}  # Count individuals, not points
-        individual_ids = set()
-        
-        for record in data:
-            lat = float(record.get('location_lat', 0))
-            lon = float(record.get('location_long', 0))
-            animal_type = record.get('animal_type', 'unknown')
-            timestamp = record.get('timestamp', '')
-            individual_id = record.get('individual_local_identifier', f'animal_{len(markers)}')
-            
-            # Calculate corrected time-based color
-            intensity = self.calculate_time_intensity(timestamp)
-            base_color = self.animal_colors.get(animal_type, '#74B9FF')
-            adjusted_color = self.adjust_color_intensity(base_color, intensity)
-            
-            # Count each individual only once
-            if individual_id not in individual_ids:
-                individual_ids.add(individual_id)
-                animal_counts[animal_type] = animal_counts.get(animal_type, 0) + 1
-            
-            markers.append({
-                'lat': lat,
-                'lng': lon,
-                'color': adjusted_color,
-                'baseColor': base_color,
-                'intensity': intensity,
-                'animal': animal_type,
-                'species': record.get('species', 'Unknown Species'),
-                'timestamp': str(timestamp)[:19] if timestamp else 'Unknown',
-                'individual_id': individual_id
-            })
-        
-        # Create HTML content with v3 improvements
-        html_content = f"""<!DOCTYPE html>
+            return 0, float(timestamp)
+        except ValueError:
+            pass
+    return 1, timestamp
+
+
+def _hex_to_rgb(color: str) -> Tuple[int, int, int]:
+    """Convert a '#rrggbb' color to an RGB tuple"""
+    return int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16)
+
+
+@lru_cache(maxsize=4096)
+def _adjust_rgb(base_rgb: Tuple[int, int, int], intensity: float) -> str:
+    """Blend a base color towards white by recency (intensities repeat per timestamp)"""
+    r, g, b = base_rgb
+
+    # CORRECTED: Higher intensity = brighter (more recent), Lower intensity = darker (older)
+    white_blend = 1 - intensity  # Amount to blend with white for recent points
+    r = round(r + (255 - r) * white_blend)
+    g = round(g + (255 - g) * white_blend)
+    b = round(b + (255 - b) * white_blend)
+
+    # Convert back to hex
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _blend_colors(base: np.ndarray, intensities: np.ndarray) -> List[str]:
+    """Blend N x 3 base RGB rows towards white by recency and return hex colors
+
+    Vectorized form of _adjust_rgb; both must give identical results.
+    """
+    # CORRECTED: Higher intensity = brighter (more recent), Lower intensity = darker (older)
+    blended = np.round(base + (255 - base) * (1 - intensities)[:, None]).astype(np.uint8)
+    return list(map('#{:02x}{:02x}{:02x}'.format, *blended.T.tolist()))
+
+
+def _leading_results(results: List[Optional[List[Dict]]], limit: int) -> List[List[Dict]]:
+    """Return up to `limit` non-empty results from the finished prefix of `results`"""
+    selected = []
+    for records in results:
+        if records is None:  # Still pending, so later results can't be counted yet
+            break
+        if records:
+            selected.append(records)
+            if len(selected) >= limit:
+                break
+    return selected
+
+
+# JSON object written for each map marker (same layout json.dumps produces)
+MARKER_TEMPLATE = (
+    '{"lat": %s, "lng": %s, "color": "%s", "baseColor": "%s", "intensity": %s, '
+    '"animal": %s, "species": %s, "timestamp": %s, "individual_id": %s}'
+)
+
+
+def _json_float(value: float) -> str:
+    """Format a float as json.dumps would"""
+    return repr(value) if math.isfinite(value) else json.dumps(value)
+
+
+def _json_value(value) -> str:
+    """Format a marker field, using the fast C string escaper for strings"""
+    if isinstance(value, str):
+        return encode_basestring_ascii(value)
+    return json.dumps(value)
+
+
+# HTML template fragments, written to the output file in order
+HTML_HEADER = """<!DOCTYPE html>
 <html>
 <head>
     <title>Animal Tracking World Map - Enhanced v3</title>
@@ -295,23 +262,18 @@ class SimpleAnimalMap:
     <div id="map"></div>
     <div class="info">
         <h3>🌍 Animal Tracking Map</h3>
-        <p><strong>Total Animals:</strong> {len(individual_ids)}</p>
-        <p><strong>Total Points:</strong> {len(markers)}</p>
+        <p><strong>Total Animals:</strong> {total_animals}</p>
+        <p><strong>Total Points:</strong> {total_points}</p>
         <div class="legend">
             <h4>Animal Classes:</h4>"""
 
-        # Add comprehensive legend for all animal types
-        all_animal_types = ['bird', 'mammal', 'reptile', 'fish', 'amphibian', 'insect']
-        for animal in all_animal_types:
-            count = animal_counts.get(animal, 0)
-            color = self.animal_colors.get(animal, '#74B9FF')
-            html_content += f'''
+LEGEND_ITEM = '''
             <div class="legend-item">
                 <span class="color-box" style="background-color: {color};"></span>
-                <span>{animal.title()}: <span id="{animal}Count">{count}</span></span>
+                <span>{label}: <span id="{animal}Count">{count}</span></span>
             </div>'''
 
-        html_content += """
+HTML_MIDDLE = """
         </div>
         <div class="time-legend">
             <h4>Time Indicator:</h4>
@@ -328,113 +290,375 @@ class SimpleAnimalMap:
         </div>
     </div>
 
-    <script>"""
-        
-        html_content += f"""
+    <script>
         // Initialize map centered globally
         var map = L.map('map').setView([30.0, -20.0], 2);
 
         // Add tile layer
-        L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
+        L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
             attribution: '© OpenStreetMap contributors'
-        }}).addTo(map);
+        }).addTo(map);
 
         // Enhanced data processing for individual animal paths
-        var animalData = {json.dumps(markers)};
-        var animalColors = {{
-            'bird': '#FF6B6B',
-            'mammal': '#4ECDC4',
-            'reptile': '#45B7D1',
-            'fish': '#96CEB4',
-            'amphibian': '#FFEAA7',
-            'insect': '#DDA0DD',
-            'unknown': '#74B9FF'
-        }};
+        var animalData = """
+
+HTML_COLORS = """;
+        var animalColors = """
+
+HTML_FOOTER = """;
         
         // Group data by individual for constellation-like path visualization
-        var animalPaths = {{}};
+        var animalPaths = {};
         
-        animalData.forEach(function(point) {{
+        animalData.forEach(function(point) {
             // Group by individual for paths
-            if (!animalPaths[point.individual_id]) {{
-                animalPaths[point.individual_id] = {{
+            if (!animalPaths[point.individual_id]) {
+                animalPaths[point.individual_id] = {
                     points: [],
                     animal: point.animal,
                     species: point.species,
                     baseColor: point.baseColor
-                }};
-            }}
+                };
+            }
             animalPaths[point.individual_id].points.push(point);
-        }});
+        });
         
         var markers = animalData;
         
         // Draw solid constellation-like migration paths
-        Object.keys(animalPaths).forEach(function(individualId) {{
+        Object.keys(animalPaths).forEach(function(individualId) {
             var pathData = animalPaths[individualId];
             var points = pathData.points;
             
-            if (points.length > 1) {{
-                // Sort by timestamp to ensure correct chronological order
-                points.sort(function(a, b) {{ 
-                    return new Date(a.timestamp) - new Date(b.timestamp); 
-                }});
-                
+            if (points.length > 1) {
+                // Points arrive pre-sorted chronologically per individual
                 // Create path coordinates
-                var pathCoords = points.map(function(p) {{ 
+                var pathCoords = points.map(function(p) { 
                     return [p.lat, p.lng]; 
-                }});
+                });
                 
                 // Draw SOLID path line (constellation-like)
-                L.polyline(pathCoords, {{
+                L.polyline(pathCoords, {
                     color: pathData.baseColor,
                     weight: 4,
                     opacity: 0.8,
                     smoothFactor: 1.0
-                }}).bindPopup(`
-                    <b>${{pathData.species}} Migration Path</b><br>
-                    Individual: ${{individualId}}<br>
-                    ${{points.length}} tracking points<br>
-                    Class: ${{pathData.animal.charAt(0).toUpperCase() + pathData.animal.slice(1)}}
+                }).bindPopup(`
+                    <b>${pathData.species} Migration Path</b><br>
+                    Individual: ${individualId}<br>
+                    ${points.length} tracking points<br>
+                    Class: ${pathData.animal.charAt(0).toUpperCase() + pathData.animal.slice(1)}
                 `).addTo(map);
-            }}
-        }});
+            }
+        });
         
         // Add markers with corrected time-based coloring and sizing
-        markers.forEach(function(marker) {{
-            var circle = L.circleMarker([marker.lat, marker.lng], {{
+        markers.forEach(function(marker) {
+            var circle = L.circleMarker([marker.lat, marker.lng], {
                 color: marker.color,
                 fillColor: marker.color,
                 fillOpacity: 0.8,
                 opacity: 1,
                 radius: Math.max(4, 6 + 4 * marker.intensity), // Size varies with recency
                 weight: 2
-            }});
+            });
             
             var timeAgo = Math.round((new Date('2024-07-31T00:00:00Z') - new Date(marker.timestamp + 'Z')) / (1000 * 60 * 60 * 24));
             
             var popup = `
                 <div style="font-family: Arial, sans-serif;">
-                    <h4 style="margin: 0 0 5px 0; color: ${{marker.baseColor}};">${{marker.animal.charAt(0).toUpperCase() + marker.animal.slice(1)}}</h4>
-                    <strong>Species:</strong> ${{marker.species || 'Unknown'}}<br>
-                    <strong>Coordinates:</strong> ${{marker.lat.toFixed(4)}}, ${{marker.lng.toFixed(4)}}<br>
-                    <strong>Date:</strong> ${{new Date(marker.timestamp + 'Z').toLocaleDateString()}}<br>
-                    <strong>Days Ago:</strong> ${{timeAgo}}<br>
-                    <strong>Individual ID:</strong> ${{marker.individual_id}}<br>
-                    <strong>Recency:</strong> ${{marker.intensity > 0.7 ? 'Recent' : marker.intensity > 0.5 ? 'Moderate' : 'Older'}}
+                    <h4 style="margin: 0 0 5px 0; color: ${marker.baseColor};">${marker.animal.charAt(0).toUpperCase() + marker.animal.slice(1)}</h4>
+                    <strong>Species:</strong> ${marker.species || 'Unknown'}<br>
+                    <strong>Coordinates:</strong> ${marker.lat.toFixed(4)}, ${marker.lng.toFixed(4)}<br>
+                    <strong>Date:</strong> ${new Date(marker.timestamp + 'Z').toLocaleDateString()}<br>
+                    <strong>Days Ago:</strong> ${timeAgo}<br>
+                    <strong>Individual ID:</strong> ${marker.individual_id}<br>
+                    <strong>Recency:</strong> ${marker.intensity > 0.7 ? 'Recent' : marker.intensity > 0.5 ? 'Moderate' : 'Older'}
                 </div>
             `;
             
             circle.bindPopup(popup);
             circle.addTo(map);
-        }});
+        });
     </script>
 </body>
 </html>"""
 
-        # Write to file
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+
+class SimpleAnimalMap:
+    def __init__(self):
+        self.base_url = "https://www.movebank.org/movebank/service/public/json"
+        self.animal_colors = {
+            'bird': '#FF6B6B',
+            'mammal': '#4ECDC4', 
+            'reptile': '#45B7D1',
+            'fish': '#96CEB4',
+            'amphibian': '#FFEAA7',
+            'insect': '#DDA0DD',
+            'unknown': '#74B9FF'
+        }
+        # Palette index per animal type and (hex, rgb) per index, so markers skip hex parsing
+        self._animal_idx = {animal: i for i, animal in enumerate(self.animal_colors)}
+        self._animal_table = [(color, _hex_to_rgb(color)) for color in self.animal_colors.values()]
+        
+        # Reuse one pooled session so repeated Movebank calls share TCP/TLS connections;
+        # with requests-cache installed, responses are also kept on disk for a day
+        if requests_cache is not None:
+            self.session = requests_cache.CachedSession(
+                'movebank_cache', backend='sqlite', expire_after=86400)
+        else:
+            self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=10,
+            max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+        )
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'Accept-Encoding': 'gzip',
+            'User-Agent': 'SimpleAnimalMap/3.0'
+        })
+    
+    def get_movebank_studies(self) -> List[Dict]:
+        """Get list of public studies with animal type information"""
+        try:
+            params = {'entity_type': 'study'}
+            response = self.session.get(self.base_url, params=params, timeout=15)
+            if response.status_code == 200:
+                studies = response.json()
+                return [s for s in studies if s.get('is_test', False) == False and 
+                       s.get('has_quota', False) == False][:20]  # Public studies only
+        except Exception as e:
+            print(f"Error fetching studies: {e}")
+        return []
+    
+    def classify_animal_from_study(self, study_info: Dict) -> str:
+        """Classify animal type based on study information"""
+        study_name = study_info.get('name', '').lower()
+        principal_investigator = study_info.get('principal_investigator_name', '').lower()
+        return _classify(study_name, principal_investigator)
+
+    def _fetch_study_info(self, study_ids: List[int]) -> Dict[str, Dict]:
+        """Fetch study records for several study IDs in one request, keyed by ID"""
+        study_params = {'entity_type': 'study', 'study_id': ','.join(map(str, study_ids))}
+        study_response = self.session.get(self.base_url, params=study_params, timeout=10)
+        if study_response.status_code == 200:
+            study_data = study_response.json()
+            if isinstance(study_data, dict):
+                study_data = [study_data]
+            return {str(s.get('id')): s for s in study_data or []}
+        return {}
+
+    def _fetch_study(self, study: Dict, study_info: Optional[Future] = None) -> Tuple[str, List[Dict], int]:
+        """Fetch and validate tracking records for a single study"""
+        study_id = study.get('id')
+        
+        # Get tracking data
+        params = {
+            'entity_type': 'event',
+            'study_id': study_id,
+            'max_events_per_individual': 20,
+            'limit': 100
+        }
+        response = self.session.get(self.base_url, params=params, timeout=15)
+        
+        # Study info (if it was missing) was requested in parallel with the events;
+        # if that request failed, keep the events and fall back to an unnamed study
+        if study_info is not None:
+            try:
+                info = study_info.result().get(str(study_id), {})
+            except Exception:
+                info = {}
+            study.update(info)
+        
+        # Classify animal type
+        animal_type = self.classify_animal_from_study(study)
+        
+        records = []
+        if response.status_code == 200:
+            data = response.json()
+            
+            if data and len(data) > 0:
+                for record in data:
+                    lat = record.get('location_lat')
+                    lon = record.get('location_long')
+                    
+                    if lat and lon:
+                        # Only the conversion can raise; the bounds check also rejects NaN
+                        try:
+                            lat, lon = float(lat), float(lon)
+                        except ValueError:
+                            continue
+                        if -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0:
+                            record['animal_type'] = animal_type
+                            record['study_name'] = study.get('name', f'Study {study_id}')
+                            record['species'] = self.extract_species_from_study(study)
+                            records.append(record)
+        
+        return animal_type, records, study_id
+
+    def get_sample_data(self) -> List[Dict]:
+        """Get sample tracking data from multiple studies"""
+        print("Fetching public studies...")
+        
+        # Get list of studies first
+        studies = self.get_movebank_studies()
+        if not studies:
+            print("No studies found, using known study IDs...")
+            studies = [{'id': 2911040}, {'id': 173641633}, {'id': 76367850}]
+        
+        # Fetch studies concurrently - the work is network-bound
+        studies = [study for study in studies[:10] if study.get('id')]  # Limit to first 10 studies
+        results = [None] * len(studies)  # Records per study, in list order
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            # Missing study info doesn't gate the event request, so both go out together.
+            # All missing records come from one batched request, queued first so a study
+            # task never waits on an unstarted one.
+            unnamed_ids = [study['id'] for study in studies if 'name' not in study]
+            info_future = executor.submit(self._fetch_study_info, unnamed_ids) if unnamed_ids else None
+            futures = {
+                executor.submit(self._fetch_study, study,
+                                info_future if 'name' not in study else None): index
+                for index, study in enumerate(studies)
+            }
+            
+            for future in as_completed(futures):
+                index = futures[future]
+                study_id = studies[index]['id']
+                try:
+                    animal_type, records, study_id = future.result()
+                except Exception as e:
+                    print(f"✗ Error with study {study_id}: {e}")
+                    records = []
+                
+                results[index] = records
+                if records:
+                    print(f"✓ Got {len(records)} points from study {study_id} ({animal_type})")
+                
+                # Stop after 5 successful studies, counted in list order rather than
+                # completion order so the same inputs always give the same map
+                if len(_leading_results(results, 5)) >= 5:
+                    for pending in futures:
+                        pending.cancel()
+                    break
+        
+        selected = _leading_results(results, 5)
+        all_data = [record for records in selected for record in records]
+        
+        print(f"Successfully processed {len(selected)} studies")
+        return all_data[:300]  # Limit for performance
+    
+    def extract_species_from_study(self, study_info: Dict) -> str:
+        """Extract species name from study information"""
+        return _extract_species(study_info.get('name', ''))
+    
+    def calculate_time_intensity(self, timestamp) -> float:
+        """Calculate time-based intensity (recent = higher value for lighter colors)"""
+        if not timestamp:
+            return 0.5
+        return _time_intensity(str(timestamp))
+    
+    def adjust_color_intensity(self, base_color: Union[str, Tuple[int, int, int]], intensity: float) -> str:
+        """Adjust color (hex or RGB tuple) based on recency (higher intensity = lighter/more recent)"""
+        try:
+            # RGB tuples (e.g. from _animal_table) skip hex parsing
+            rgb = base_color if isinstance(base_color, tuple) else _hex_to_rgb(base_color)
+            return _adjust_rgb(rgb, intensity)
+        except:
+            return base_color if isinstance(base_color, str) else self.animal_colors['unknown']
+    
+    def generate_html_map(self, data: List[Dict], filename: str = "animal_map.html", compress: bool = False):
+        """Generate enhanced interactive HTML map with v3 improvements (gzipped to filename.gz if compress)"""
+        
+        # Order points by individual and time so the page can draw paths without sorting
+        data = sorted(data, key=lambda r: (str(r.get('individual_local_identifier', '')),
+                                           _timestamp_sort_key(r.get('timestamp', ''))))
+        
+        # Vectorize the numeric columns: coordinates, recency and blended colors
+        n = len(data)
+        lats = np.fromiter((float(r.get('location_lat', 0)) for r in data), float, n)
+        lons = np.fromiter((float(r.get('location_long', 0)) for r in data), float, n)
+        intensities = np.fromiter(
+            (self.calculate_time_intensity(r.get('timestamp', '')) for r in data), float, n)
+        
+        animal_table = self._animal_table
+        unknown_idx = self._animal_idx['unknown']
+        animal_types = [r.get('animal_type', 'unknown') for r in data]
+        animal_idx_get = self._animal_idx.get
+        animal_idx = np.fromiter((animal_idx_get(a, unknown_idx) for a in animal_types), np.intp, n)
+        
+        base = np.array([rgb for _, rgb in animal_table], dtype=float)[animal_idx]
+        colors = _blend_colors(base, intensities)
+        
+        # Resolve individual IDs once; the fallback name is only formatted when the ID is missing
+        individual_ids = []
+        for i, record in enumerate(data):
+            individual_id = record.get('individual_local_identifier')
+            if individual_id is None:
+                individual_id = f'animal_{i}'
+            individual_ids.append(individual_id)
+        
+        # Count individuals, not points: each individual keeps the class of its first record
+        individual_types = {}
+        for individual_id, animal_type in zip(individual_ids, animal_types):
+            individual_types.setdefault(individual_id, animal_type)
+        animal_counts = Counter(individual_types.values())
+        
+        # Stream the page to disk fragment by fragment instead of building one big string
+        if compress:
+            filename += '.gz'
+            output = gzip.open(filename, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            output = open(filename, 'w', encoding='utf-8', buffering=1 << 16)
+        
+        with output as f:
+            f.write(HTML_HEADER.format(total_animals=len(individual_types), total_points=n))
+            
+            # Add comprehensive legend for all animal types
+            all_animal_types = [animal for animal in self.animal_colors if animal != 'unknown']
+            for animal in all_animal_types:
+                f.write(LEGEND_ITEM.format(
+                    color=self.animal_colors[animal],
+                    label=animal.title(),
+                    animal=animal,
+                    count=animal_counts.get(animal, 0)
+                ))
+            
+            f.write(HTML_MIDDLE)
+            
+            # Write each marker straight into the JSON payload instead of building dicts;
+            # loop-invariant lookups are bound to locals to keep the hot loop tight
+            write = f.write
+            marker_template = MARKER_TEMPLATE
+            json_float = _json_float
+            json_value = _json_value
+            
+            write('[')
+            for i, (record, lat, lon, intensity, idx, animal_type, adjusted_color, individual_id) in enumerate(zip(
+                    data, lats.tolist(), lons.tolist(), intensities.tolist(),
+                    animal_idx.tolist(), animal_types, colors, individual_ids)):
+                g = record.get
+                timestamp = g('timestamp', '')
+                
+                if i:
+                    write(', ')
+                write(marker_template % (
+                    json_float(lat),
+                    json_float(lon),
+                    adjusted_color,
+                    animal_table[idx][0],
+                    json_float(intensity),
+                    json_value(animal_type),
+                    json_value(g('species', 'Unknown Species')),
+                    json_value(str(timestamp)[:19] if timestamp else 'Unknown'),
+                    json_value(individual_id)
+                ))
+            write(']')
+            
+            # Emit the palette from animal_colors so Python and JS share one source
+            write(HTML_COLORS)
+            write(json.dumps(self.animal_colors))
+            write(HTML_FOOTER)
         
         print(f"✅ Map saved as '{filename}'")
         return filename
@@ -500,7 +724,11 @@ def main():
     filename = mapper.generate_html_map(data)
     
     # Count unique individuals
-    unique_individuals = len(set(d.get('individual_local_identifier', f'animal_{i}') for i, d in enumerate(data)))
+    individual_ids = set()
+    for i, d in enumerate(data):
+        individual_id = d.get('individual_local_identifier')
+        individual_ids.add(f'animal_{i}' if individual_id is None else individual_id)
+    unique_individuals = len(individual_ids)
     print(f"📊 Summary: {unique_individuals} individual animals, {len(data)} tracking points")
     print(f"🗺️  Open '{filename}' in your browser!")
     print(f"🎨 Features: All 6 animal classes, corrected time-based coloring (lighter=recent)")